@@ -53,6 +53,7 @@ func main() {
 	useDuplicatedSize := flag.Int("duplicated", -1, "Load duplicated data. Provide 0 for all records, or N > 0 for a subset of N records. Omit flag for standard data.")
 	// The util package's init function will register "mode", "workers", "scorers", "topk", "limit".
 	flag.Parse()
+	defer query.Close() // Stop the background query parser process on exit
 
 	// Validate mode
 	if *util.Mode != "seq" && *util.Mode != "bsp" && *util.Mode != "pipeline" && *util.Mode != "ws" {
@@ -1,11 +1,15 @@
 package query
 
 import (
+	"bufio"
 	"encoding/json"
 	"fmt"
+	"io"
+	"os"
 	"os/exec"
 	"path/filepath"
 	"runtime"
+	"sync"
 	"time" // Added for timing
 )
 
@@ -28,8 +32,30 @@ func getQueryParserScriptPath() (string, error) {
 	return scriptPath, nil
 }
 
-func Parse(userInput string) (Query, time.Duration, error) {
-	startTime := time.Now() // Start timer
+// parserDaemon is a long-lived `query_parser.py --serve` process. Requests are written to its
+// stdin as JSON lines tagged with an id, and each answer comes back as one JSON line on stdout
+// carrying the same id. The daemon batches concurrent requests, so answers may arrive out of
+// order; a reader goroutine hands each one to the caller waiting on its id. Python start-up and
+// the openai import are paid once per program run instead of once per query.
+type parserDaemon struct {
+	cmd     *exec.Cmd
+	stdin   io.WriteCloser
+	writeMu sync.Mutex // one request line at a time on stdin
+
+	mu      sync.Mutex // guards nextID and pending
+	nextID  int64
+	pending map[int64]chan []byte
+
+	done chan struct{} // closed once stdout is exhausted, i.e. the process has exited
+}
+
+var (
+	daemonMu sync.Mutex // guards daemon
+	daemon   *parserDaemon
+)
+
+// parserCommand builds the command that runs the parser daemon. Tests replace it with a stub.
+var parserCommand = func() (*exec.Cmd, error) {
 	pythonCmd := "python"
 	if runtime.GOOS != "windows" {
 		pythonCmd = "python3"
@@ -37,16 +63,179 @@ func Parse(userInput string) (Query, time.Duration, error) {
 
 	scriptPath, err := getQueryParserScriptPath()
 	if err != nil {
-		return Query{}, 0, fmt.Errorf("could not get query parser script path: %w", err)
+		return nil, fmt.Errorf("could not get query parser script path: %w", err)
 	}
+	return exec.Command(pythonCmd, scriptPath, "--serve"), nil
+}
 
-	cmd := exec.Command(pythonCmd, scriptPath, userInput)
-	out, err := cmd.Output()
-	duration := time.Since(startTime) // Calculate duration
+func startParserDaemon() (*parserDaemon, error) {
+	cmd, err := parserCommand()
+	if err != nil {
+		return nil, err
+	}
+	cmd.Stderr = os.Stderr
+	stdin, err := cmd.StdinPipe()
+	if err != nil {
+		return nil, fmt.Errorf("failed to open query parser stdin: %w", err)
+	}
+	stdout, err := cmd.StdoutPipe()
+	if err != nil {
+		return nil, fmt.Errorf("failed to open query parser stdout: %w", err)
+	}
+	if err := cmd.Start(); err != nil {
+		return nil, fmt.Errorf("failed to start query parser: %w", err)
+	}
+	d := &parserDaemon{cmd: cmd, stdin: stdin, pending: make(map[int64]chan []byte), done: make(chan struct{})}
+	go d.readReplies(stdout)
+	return d, nil
+}
+
+// readReplies routes every reply line to the caller waiting on its id until stdout closes.
+func (d *parserDaemon) readReplies(stdout io.Reader) {
+	defer close(d.done)
+	r := bufio.NewReader(stdout)
+	for {
+		line, err := r.ReadBytes('\n')
+		if err != nil {
+			return
+		}
+		var reply struct {
+			ID int64 `json:"id"`
+		}
+		if json.Unmarshal(line, &reply) != nil {
+			continue
+		}
+		d.mu.Lock()
+		ch, ok := d.pending[reply.ID]
+		d.mu.Unlock()
+		if ok {
+			ch <- line // buffered, so this never blocks
+		}
+	}
+}
+
+func (d *parserDaemon) call(request map[string]string) ([]byte, error) {
+	reply := make(chan []byte, 1)
+	d.mu.Lock()
+	d.nextID++
+	id := d.nextID
+	d.pending[id] = reply
+	d.mu.Unlock()
+	defer func() {
+		d.mu.Lock()
+		delete(d.pending, id)
+		d.mu.Unlock()
+	}()
+
+	tagged := map[string]interface{}{"id": id}
+	for k, v := range request {
+		tagged[k] = v
+	}
+	payload, err := json.Marshal(tagged)
+	if err != nil {
+		return nil, fmt.Errorf("failed to marshal parser request: %w", err)
+	}
+
+	d.writeMu.Lock()
+	_, err = d.stdin.Write(append(payload, '\n'))
+	d.writeMu.Unlock()
 	if err != nil {
-		if exitErr, ok := err.(*exec.ExitError); ok {
-			fmt.Println("Python stderr:", string(exitErr.Stderr))
+		return nil, fmt.Errorf("failed to send request to query parser: %w", err)
+	}
+
+	select {
+	case out := <-reply:
+		return out, nil
+	case <-d.done:
+		// The reply may have been delivered just before stdout closed
+		select {
+		case out := <-reply:
+			return out, nil
+		default:
+			return nil, fmt.Errorf("query parser exited before answering")
 		}
+	}
+}
+
+// close stops the process: a clean shutdown via EOF on stdin, or a kill after a failure.
+func (d *parserDaemon) close(kill bool) {
+	d.stdin.Close() // EOF on stdin makes the Python side exit once its queries are answered
+	if kill {
+		d.cmd.Process.Kill()
+	}
+	<-d.done // stdout must be drained before Wait
+	d.cmd.Wait()
+}
+
+func currentDaemon() (*parserDaemon, error) {
+	daemonMu.Lock()
+	defer daemonMu.Unlock()
+	if daemon == nil {
+		d, err := startParserDaemon()
+		if err != nil {
+			return nil, err
+		}
+		daemon = d
+	}
+	return daemon, nil
+}
+
+// dropDaemon discards a daemon that failed a request. Concurrent callers may see the same
+// failure, so only the first one to get here tears it down.
+func dropDaemon(d *parserDaemon) {
+	daemonMu.Lock()
+	if daemon != d {
+		daemonMu.Unlock()
+		return
+	}
+	daemon = nil
+	daemonMu.Unlock()
+	d.close(true)
+}
+
+// callParser sends one request to the parser daemon, starting it on first use. Concurrent calls
+// share the daemon (and so its request batching). If the daemon has died it is restarted once
+// before giving up.
+func callParser(request map[string]string) ([]byte, error) {
+	var lastErr error
+	for attempt := 0; attempt < 2; attempt++ {
+		d, err := currentDaemon()
+		if err != nil {
+			return nil, err
+		}
+		out, err := d.call(request)
+		if err == nil {
+			// The daemon reports a failed query as {"error": "..."} and stays up for the next one
+			var failure struct {
+				Error string `json:"error"`
+			}
+			if json.Unmarshal(out, &failure) == nil && failure.Error != "" {
+				return nil, fmt.Errorf("query parser error: %s", failure.Error)
+			}
+			return out, nil
+		}
+		lastErr = err
+		dropDaemon(d)
+	}
+	return nil, lastErr
+}
+
+// Close shuts down the background query parser process, if one was started.
+func Close() {
+	daemonMu.Lock()
+	d := daemon
+	daemon = nil
+	daemonMu.Unlock()
+	if d != nil {
+		d.close(false)
+	}
+}
+
+func Parse(userInput string) (Query, time.Duration, error) {
+	startTime := time.Now() // Start timer
+	out, err := callParser(map[string]string{"user_input": userInput})
+	duration := time.Since(startTime) // Calculate duration
+	if err != nil {
 		return Query{}, duration, err
 	}
 
@@ -78,15 +267,6 @@ func MergeMetadata(oldMap, newMap map[string]interface{}) map[string]interface{}
 
 func ParseWithHistory(prevQ Query, newInput string) (Query, time.Duration, error) {
 	startTime := time.Now() // Start timer
-	pythonCmd := "python"
-	if runtime.GOOS != "windows" {
-		pythonCmd = "python3"
-	}
-
-	scriptPath, err := getQueryParserScriptPath()
-	if err != nil {
-		return Query{}, 0, fmt.Errorf("could not get query parser script path: %w", err)
-	}
 
 	// Convert only the previous metadata map to JSON
 	prevMetadataJSON, err := json.Marshal(prevQ.Metadata)
@@ -94,14 +274,9 @@ func ParseWithHistory(prevQ Query, newInput string) (Query, time.Duration, error
 		return Query{}, 0, fmt.Errorf("failed to marshal previous metadata: %w", err)
 	}
 
-	// Pass as argv[1] = prevMetadataJSON_string, argv[2] = newUserText
-	cmd := exec.Command(pythonCmd, scriptPath, string(prevMetadataJSON), newInput)
-	out, err := cmd.Output()
+	out, err := callParser(map[string]string{"previous_metadata": string(prevMetadataJSON), "new_input": newInput})
 	duration := time.Since(startTime) // Calculate duration
 	if err != nil {
-		if exitErr, ok := err.(*exec.ExitError); ok {
-			fmt.Println("Python stderr:", string(exitErr.Stderr))
-		}
 		return Query{}, duration, err
 	}
 
@@ -1,116 +1,558 @@
+import asyncio
+import hashlib
 import json
+import os
+import pathlib
+import socket
+import sqlite3
+import stat
 import sys
-import openai
+import tempfile
+import traceback
+import numpy as np
+from openai import AsyncOpenAI, OpenAIError
 
-# If you install openai==0.28.0, this code continues to work:
-openai.api_key = ""
+# orjson is optional: it (de)serializes several times faster than the stdlib json module.
+# json_dumpb gives UTF-8 bytes for the stdout/socket protocol, so output never depends on the
+# console encoding (writing non-ASCII text to a cp1252 stdout raises UnicodeEncodeError).
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumpb = orjson.dumps
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
+    def json_dumpb(obj):
+        return json.dumps(obj).encode()
 
-def main():
-    # Template for metadata fields, used in initial prompt
-    metadata_template = {
-        "photo_submitted_at": None,
-        "photo_featured": None,
-        "photo_width": None,
-        "photo_height": None,
-        "photo_aspect_ratio": None,
-        "photo_description": None,
-        "photographer_username": None,
-        "photographer_first_name": None,
-        "photographer_last_name": None,
-        "exif_camera_make": None,
-        "exif_camera_model": None,
-        "year": None,
-        "month": None,
-        "day": None,
-        "exif_iso": None,
-        "exif_aperture_value": None,
-        "exif_focal_length": None,
-        "exif_exposure_time": None,
-        "photo_location_name": None,
-        "photo_location_latitude": None,
-        "photo_location_longitude": None,
-        "photo_location_country": None,
-        "photo_location_city": None
-    }
+def write_line(obj):
+    sys.stdout.buffer.write(json_dumpb(obj) + b"\n")
+    sys.stdout.buffer.flush()
 
-    # Check if we are in reprompt mode (sys.argv[1] = prev_metadata_json, sys.argv[2] = new_user_input)
-    if len(sys.argv) == 3: # script_name, prev_metadata_json, new_user_input
-        previous_metadata_json_str = sys.argv[1]
-        new_user_input_str = sys.argv[2]
-        
-        prompt_text = f"""
-Here is the current JSON object of photo metadata:
-{previous_metadata_json_str}
+# Requires openai>=1.0 and OPENAI_API_KEY in the environment. The async client lets the
+# daemon keep many calls in flight on one connection pool.
+_client = None
+
+def get_client():
+    # Created on first use, so answers served from the local cache never need credentials
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI()
+    return _client
+
+# Daemon mode: queries arriving within BATCH_WINDOW_S of each other share chat completions.
+# The socket lives in a per-user location so other users on the machine can't reach or replace it.
+def default_socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "ai_image_finder_query_parser.sock")
+    return os.path.join(tempfile.gettempdir(), f"ai_image_finder_query_parser_{os.getuid()}.sock")
+
+DAEMON_SOCKET = os.environ.get("QUERY_PARSER_SOCKET") or default_socket_path()
+BATCH_WINDOW_S = 0.25
+BATCH_MAX = 8
+DAEMON_TIMEOUT_S = 30 # a daemon that hasn't answered by then is treated as hung
+
+# Local cache of parsed queries, so repeated searches skip the OpenAI round-trip entirely
+CACHE_PATH = pathlib.Path(__file__).resolve().parents[2] / "data" / "cache" / "query_cache.sqlite"
+EMBEDDING_MODEL = "text-embedding-3-small"
+SIMILARITY_THRESHOLD = 0.97  # cosine similarity needed to reuse the parse of a different wording
+CACHE_HIT_MESSAGE = "Extracted metadata from local cache (cache hit, cost: $0.000000)"
+
+# Simple queries go to the cheap model, anything longer, negated or multi-clause to the strong one
+CHEAP_MODEL = "gpt-4o-mini"
+STRONG_MODEL = "o3-mini"
+SIMPLE_QUERY_WORD_LIMIT = 12
+NEGATIONS = {"not", "no", "without", "except", "never", "nor"}
+CLAUSE_MARKERS = {",", ";", "but", "or", "although", "while", "which"}
+ROUTING_LOG_PATH = CACHE_PATH.parent / "model_routing.jsonl"
+
+# Dollars per million tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "o3-mini": (1.10, 0.55, 4.40),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+# The usage chunk trails the streamed content; this is how long we wait for it once the JSON is complete
+USAGE_GRACE_S = 0.2
 
-The user has provided this new information:
-"{new_user_input_str}"
+# Template for metadata fields, used in the system prompt
+METADATA_TEMPLATE = {
+    "photo_submitted_at": None,
+    "photo_featured": None,
+    "photo_width": None,
+    "photo_height": None,
+    "photo_aspect_ratio": None,
+    "photo_description": None,
+    "photographer_username": None,
+    "photographer_first_name": None,
+    "photographer_last_name": None,
+    "exif_camera_make": None,
+    "exif_camera_model": None,
+    "year": None,
+    "month": None,
+    "day": None,
+    "exif_iso": None,
+    "exif_aperture_value": None,
+    "exif_focal_length": None,
+    "exif_exposure_time": None,
+    "photo_location_name": None,
+    "photo_location_latitude": None,
+    "photo_location_longitude": None,
+    "photo_location_country": None,
+    "photo_location_city": None
+}
 
-Please update the JSON object above based on the new information.
+# Dumped once at import rather than per call, so the prompt prefix cannot drift between invocations
+METADATA_TEMPLATE_JSON = json.dumps(METADATA_TEMPLATE, indent=2)
+
+# Everything that never changes between calls lives in the system message, ahead of the
+# user-specific text. OpenAI caches prompts by exact prefix, so this string must stay
+# byte-identical across invocations (no timestamps, no per-call formatting).
+SYSTEM_PROMPT = f"""You are a helpful assistant. Do not wrap your JSON in triple backticks or code fences. Return valid JSON only.
+
+You extract photo metadata from a user's description of a photo they are searching for.
+The metadata is a JSON object with exactly these fields:
+{METADATA_TEMPLATE_JSON}
+
+Requests come in one of two forms.
+
+1. 'User input: "<text>"'
+Based on the user input, generate a JSON object with the photo metadata fields above.
+Infer values where possible. If a field cannot be determined, use null.
+You are allowed to infer values based on context, for example, if a country or city is provided, you can impute a random latitude and longitude in that area.
+However, do not invent values if you have no clue; leave them as null unless you are 99% sure of your guess.
+
+2. 'Previous metadata: <JSON object>' followed by 'New info: "<text>"'
+Update the previous JSON object based on the new information.
 If the new information provides a value for a field, use it.
 If the new information implies a field should be null (e.g., "I forgot the year"), set it to null.
 Otherwise, preserve existing non-null values from the provided JSON object.
-For the 'photo_location_country' field, if a country is identified by an alias (e.g., "USA", "UK"), please use its canonical name (e.g., "United States", "United Kingdom").
-Return *only* the updated JSON object (the metadata map itself), not wrapped in any other structure.
-        """
-    elif len(sys.argv) == 2: # script_name, user_input
-        user_input = sys.argv[1]
-        prompt_text = f"""
-User input: "{user_input}"
-Based on the user input, please generate a JSON object with the following photo metadata fields:
-{json.dumps(metadata_template, indent=2)}
 
-Infer values where possible. If a field cannot be determined, use null.
-You are allowed to infer values based on context, for example, if a country or city is provided, you can impute a random latitude and longitude in that area. 
-However, do not invent values if you have no clue; leave them as null unless you are 99% sure of your guess.
 For the 'photo_location_country' field, if a country is identified by an alias (e.g., "USA", "UK"), please use its canonical name (e.g., "United States", "United Kingdom").
-Return *only* the JSON object (the metadata map itself), not wrapped in any other structure.
-        """
-    else: # No input or incorrect number of arguments
-        user_input = input("Please enter your search query: ")
-        prompt_text = f"""
-User input: "{user_input}"
-Based on the user input, please generate a JSON object with the following photo metadata fields:
-{json.dumps(metadata_template, indent=2)}
+Return *only* the JSON object (the metadata map itself), not wrapped in any other structure."""
 
-Infer values where possible. If a field cannot be determined, use null.
-For the 'photo_location_country' field, if a country is identified by an alias (e.g., "USA", "UK"), please use its canonical name (e.g., "United States", "United Kingdom").
-Return *only* the JSON object (the metadata map itself), not wrapped in any other structure.
-        """
-    
-    response = openai.ChatCompletion.create(
-        model="o3-mini",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant. Do not wrap your JSON in triple backticks or code fences. Return valid JSON only."},
-            {"role": "user", "content": prompt_text}
-        ]
+# One connection per process. Embeddings are held in memory as a single matrix (rows in step with
+# _cache_meta), so a similarity lookup is one matrix-vector product instead of a table scan.
+_cache_conn = None
+_cache_matrix = None
+_cache_meta = []
+_cache_rows = {} # key -> row in _cache_matrix
+
+def open_cache():
+    global _cache_conn, _cache_matrix
+    if _cache_conn is None:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH)
+        conn.execute("CREATE TABLE IF NOT EXISTS query_cache (key TEXT PRIMARY KEY, embedding BLOB, metadata TEXT)")
+        rows = conn.execute("SELECT key, embedding, metadata FROM query_cache WHERE embedding IS NOT NULL").fetchall()
+        if rows:
+            _cache_matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob, _ in rows])
+            _cache_meta[:] = [metadata for _, _, metadata in rows]
+            _cache_rows.update((key, i) for i, (key, _, _) in enumerate(rows))
+        _cache_conn = conn
+    return _cache_conn
+
+def cache_key(*parts):
+    # Case and whitespace differences should not cause a miss
+    normalized = "\x1f".join(" ".join(p.lower().split()) for p in parts)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+async def embed(texts):
+    """Returns unit-normalized embeddings for texts, or Nones if the embedding call fails."""
+    try:
+        response = await get_client().embeddings.create(model=EMBEDDING_MODEL, input=texts)
+    except OpenAIError:
+        return [None] * len(texts)
+    vecs = [np.asarray(d.embedding, dtype=np.float32) for d in response.data]
+    return [vec / np.linalg.norm(vec) for vec in vecs]
+
+def lookup_cache(conn, key, embedding=None):
+    """Returns cached metadata for an exact key match, falling back to the most similar embedding."""
+    row = conn.execute("SELECT metadata FROM query_cache WHERE key = ?", (key,)).fetchone()
+    if row is not None:
+        return json_loads(row[0])
+    if embedding is None:
+        return None
+
+    if _cache_matrix is None:
+        return None
+    scores = _cache_matrix @ embedding
+    best = int(np.argmax(scores))
+    if scores[best] >= SIMILARITY_THRESHOLD:
+        return json_loads(_cache_meta[best])
+    return None
+
+def store_cache(conn, key, embedding, metadata):
+    global _cache_matrix
+    blob = embedding.tobytes() if embedding is not None else None
+    metadata_json = json_dumps(metadata)
+    conn.execute("INSERT OR REPLACE INTO query_cache VALUES (?, ?, ?)", (key, blob, metadata_json))
+    conn.commit()
+    if embedding is None:
+        return
+    # Mirror the write into the in-memory matrix, replacing the row if the key was already there
+    if key in _cache_rows:
+        _cache_matrix[_cache_rows[key]] = embedding
+        _cache_meta[_cache_rows[key]] = metadata_json
+    else:
+        _cache_rows[key] = len(_cache_meta)
+        _cache_meta.append(metadata_json)
+        row = embedding[np.newaxis, :]
+        _cache_matrix = row if _cache_matrix is None else np.vstack([_cache_matrix, row])
+
+def user_message(request):
+    if "previous_metadata" in request:
+        return f'Previous metadata: {request["previous_metadata"]}\nNew info: "{request["new_input"]}"'
+    return f'User input: "{request["user_input"]}"'
+
+def check_request(request):
+    """Raises ValueError unless request has one of the two shapes parse_batch accepts."""
+    if not isinstance(request, dict):
+        raise ValueError("request must be a JSON object")
+    fields = ("previous_metadata", "new_input") if "previous_metadata" in request else ("user_input",)
+    for field in fields:
+        if not isinstance(request.get(field), str):
+            raise ValueError(f'"{field}" must be a string')
+
+def request_key(request):
+    if "previous_metadata" in request:
+        return cache_key(request["previous_metadata"], request["new_input"])
+    return cache_key(request["user_input"])
+
+def choose_model(request):
+    """Picks the cheap model for short, single-clause, non-negated input and escalates the rest to o3-mini."""
+    text = request.get("user_input", request.get("new_input", "")).lower()
+    words = text.replace(",", " , ").replace(";", " ; ").split()
+    if len(words) < SIMPLE_QUERY_WORD_LIMIT and not any(w in NEGATIONS or w.endswith("n't") for w in words) \
+            and not any(w in CLAUSE_MARKERS for w in words):
+        return CHEAP_MODEL
+    return STRONG_MODEL
+
+def log_routing(model, n_requests, valid_json):
+    # One line per completion, so the escalation boundary can be audited against JSON validity later
+    ROUTING_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(ROUTING_LOG_PATH, "a") as f:
+        f.write(json_dumps({"model": model, "requests": n_requests, "valid_json": valid_json}) + "\n")
+
+def compute_cost(usage, model=STRONG_MODEL):
+    """Returns (cost in dollars, cached prompt tokens, total prompt tokens) for a response's usage."""
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    # Prompt tokens served from OpenAI's prefix cache are billed at half price
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    uncached_tokens = prompt_tokens - cached_tokens
+    # o1 cost: 15 dollars per million input tokens
+    # o3 cost: 10 dollars per million input tokens
+    input_rate, cached_rate, output_rate = MODEL_PRICING[model]
+    cost = (uncached_tokens * input_rate + cached_tokens * cached_rate + completion_tokens * output_rate) / 1000000.0
+    return cost, cached_tokens, prompt_tokens
+
+async def stream_json(messages, model=STRONG_MODEL):
+    """
+    Streams a chat completion and returns (text, parsed JSON or None, usage dict or None).
+    Reading stops as soon as the accumulated text parses as JSON; after that we only wait up
+    to USAGE_GRACE_S for the trailing usage chunk, so cost reporting never delays the result.
+    """
+    stream = await get_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True}
     )
-    
+    text = ""
+    parsed = None
+    usage = None
+    async for chunk in stream:
+        if chunk.usage is not None:
+            usage = chunk.usage.model_dump()
+        if not chunk.choices:
+            continue
+        text += chunk.choices[0].delta.content or ""
+        # Only attempt a parse once the text could be a complete object or array
+        if text.rstrip().endswith(("}", "]")):
+            try:
+                parsed = json_loads(text)
+                break
+            except ValueError:
+                pass
+    if parsed is not None and usage is None:
+        try:
+            async with asyncio.timeout(USAGE_GRACE_S):
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = chunk.usage.model_dump()
+        except TimeoutError:
+            pass
+    await stream.close()
+    return text, parsed, usage
+
+async def complete(conn, model, requests, misses, keys, embeddings, results):
+    """Sends requests[i] for every i in misses to model in one chat completion and fills in results[i]."""
+    if len(misses) == 1:
+        prompt_text = user_message(requests[misses[0]])
+    else:
+        prompt_text = ("The following JSON array holds several independent requests. Handle each one as described "
+                       "and return a JSON array with exactly one metadata object per request, in the same order.\n"
+                       + json.dumps([user_message(requests[i]) for i in misses]))
+
+    result_text, parsed, usage = await stream_json([
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt_text}
+    ], model=model)
+
     # Calculate cost
-    usage = response.get("usage", {})
-    prompt_tokens = usage.get("prompt_tokens", 0)
-    completion_tokens = usage.get("completion_tokens", 0)
-    # o3-mini cost: 1.1 dollars per million tokens
-    # o1 cost: 15 dollars per million tokens
-    # o3 cost: 10 dollars per million tokens 
-    cost = (prompt_tokens + completion_tokens) / 1000000.0 * 1.1 
-    
-    
-    result_text = response.choices[0].message.content
-    
-    # Try to parse the response as JSON (this should be the flat metadata map)
+    batch_note = f"batch of {len(misses)}, " if len(misses) > 1 else ""
+    if usage is not None:
+        cost, cached_tokens, prompt_tokens = compute_cost(usage, model)
+        cache_hit_rate = cached_tokens / prompt_tokens if prompt_tokens else 0.0
+        message = (f"Extracted metadata from GPT ({model}, {batch_note}cost: ${cost:.6f}, "
+                   f"cacheReadInputTokens: {cached_tokens}/{prompt_tokens}, "
+                   f"cache hit rate: {cache_hit_rate:.0%})")
+    else:
+        message = f"Extracted metadata from GPT ({model}, {batch_note}streamed, usage not reported)"
+
+    # Try to parse the response as JSON (a flat metadata map, or an array of them for a batch)
+    try:
+        if parsed is None:
+            parsed = json_loads(result_text)
+        if len(misses) == 1:
+            parsed = [parsed]
+        elif not isinstance(parsed, list) or len(parsed) != len(misses):
+            raise ValueError("expected one metadata object per request")
+        for i, metadata_fields_map in zip(misses, parsed):
+            store_cache(conn, keys[i], embeddings[i], metadata_fields_map)
+            results[i] = {"message": message, "metadata": metadata_fields_map}
+        valid_json = True
+    except (json.JSONDecodeError, ValueError):
+        for i in misses:
+            results[i] = {"message": message, "metadata": {"error": "Failed to parse response as JSON", "raw_text": result_text}}
+        valid_json = False
+    log_routing(model, len(misses), valid_json)
+
+async def parse_batch(requests):
+    """
+    Parses a list of requests ({"user_input": ...} or {"previous_metadata": ..., "new_input": ...})
+    into Query-shaped results, answering from the local cache where possible and sending all
+    remaining requests to OpenAI in one chat completion per routed model.
+    """
+    conn = open_cache()
+    results = [None] * len(requests)
+    keys = [request_key(r) for r in requests]
+    embeddings = [None] * len(requests)
+
+    for i, key in enumerate(keys):
+        cached = lookup_cache(conn, key)
+        if cached is not None:
+            results[i] = {"message": CACHE_HIT_MESSAGE, "metadata": cached}
+
+    # No exact hit: one cheap embedding call can still save the full completion.
+    # Updates depend on the exact previous metadata, so only fresh queries are matched by similarity.
+    fresh = [i for i, r in enumerate(requests) if results[i] is None and "user_input" in r]
+    if fresh:
+        for i, vec in zip(fresh, await embed([requests[i]["user_input"] for i in fresh])):
+            embeddings[i] = vec
+            cached = lookup_cache(conn, keys[i], vec)
+            if cached is not None:
+                results[i] = {"message": CACHE_HIT_MESSAGE, "metadata": cached}
+
+    misses = [i for i in range(len(requests)) if results[i] is None]
+    if not misses:
+        return results
+
+    # Route each miss to the cheapest model that can handle it; every model used gets one call
+    by_model = {}
+    for i in misses:
+        by_model.setdefault(choose_model(requests[i]), []).append(i)
+    groups = list(by_model.items())
+    outcomes = await asyncio.gather(*(complete(conn, model, requests, group, keys, embeddings, results)
+                                      for model, group in groups), return_exceptions=True)
+    # A failed call only fails its own group; cache hits and the other model's answers still stand
+    for (model, group), outcome in zip(groups, outcomes):
+        if isinstance(outcome, BaseException):
+            traceback.print_exception(outcome)
+            for i in group:
+                results[i] = {"error": f"{model} call failed: {outcome}"}
+    return results
+
+def start_batcher():
+    """
+    Starts the request batcher shared by both daemon transports and returns submit(request), which
+    resolves to that request's result. Exact cache hits are answered on the spot. Other requests go
+    out at once when the daemon is idle; while a batch is in flight, new ones are buffered for up
+    to BATCH_WINDOW_S (or BATCH_MAX requests) and parsed together, sharing one OpenAI round-trip.
+    """
+    queue = asyncio.Queue()
+    running = set() # strong references, so background tasks aren't garbage collected
+    in_flight = set() # batches still waiting on OpenAI
+
+    async def run_batch(batch):
+        try:
+            results = await parse_batch([request for request, _ in batch])
+        except Exception as e:
+            # A top-level "error" tells each caller its query failed; the daemon itself keeps running
+            traceback.print_exc()
+            results = [{"error": str(e)}] * len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    async def batcher():
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            await asyncio.sleep(0) # let requests that arrived together join this batch
+            while len(batch) < BATCH_MAX and not queue.empty():
+                batch.append(queue.get_nowait())
+            # Nothing else waiting: a lone interactive query shouldn't pay for the window
+            if in_flight:
+                deadline = loop.time() + BATCH_WINDOW_S
+                while len(batch) < BATCH_MAX:
+                    try:
+                        batch.append(await asyncio.wait_for(queue.get(), timeout=max(0.0, deadline - loop.time())))
+                    except asyncio.TimeoutError:
+                        break
+            # Keep collecting the next batch while this one waits on OpenAI
+            task = asyncio.create_task(run_batch(batch))
+            for tasks in (running, in_flight):
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+    async def submit(request):
+        cached = lookup_cache(open_cache(), request_key(request))
+        if cached is not None:
+            return {"message": CACHE_HIT_MESSAGE, "metadata": cached}
+        future = asyncio.get_running_loop().create_future()
+        await queue.put((request, future))
+        return await future
+
+    running.add(asyncio.create_task(batcher()))
+    return submit
+
+async def serve(socket_path=DAEMON_SOCKET):
+    """
+    Runs the batching daemon on a unix socket. Each client connection sends one JSON request line
+    and receives one JSON result line.
+    """
+    submit = start_batcher()
+
+    async def handle_client(reader, writer):
+        line = await reader.readline()
+        if not line:
+            writer.close()
+            return
+        # Malformed requests are turned away here, so they can never fail the rest of a batch
+        try:
+            request = json_loads(line)
+            check_request(request)
+        except ValueError as e:
+            result = {"error": f"malformed request: {e}"}
+        else:
+            result = await submit(request)
+        writer.write(json_dumpb(result) + b"\n")
+        await writer.drain()
+        writer.close()
+
+    # Only clear away a stale socket of our own, never some other file at that path
+    try:
+        st = os.lstat(socket_path)
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+            raise RuntimeError(f"refusing to replace {socket_path}: not a socket owned by this user")
+        os.unlink(socket_path)
+    # Create the socket as owner-only (0600) from the start, rather than chmod-ing it afterwards
+    old_umask = os.umask(0o177)
+    try:
+        server = await asyncio.start_unix_server(handle_client, path=socket_path)
+    finally:
+        os.umask(old_umask)
+    async with server:
+        await server.serve_forever()
+
+async def serve_stdio():
+    """
+    Runs the batching daemon over stdin/stdout, as used by internal/query. Each stdin line is a
+    JSON request with an "id"; its result line carries the same id. Requests are answered as their
+    batches complete, so replies can arrive out of order. Keeping this process alive means Python
+    start-up, the openai import and the HTTP connection pool are paid for once instead of per query.
+    """
+    loop = asyncio.get_running_loop()
+    submit = start_batcher()
+    answering = set()
+
+    async def answer(request_id, request):
+        result = await submit(request)
+        write_line({**result, "id": request_id})
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.buffer.readline)
+        if not line:
+            break # parent closed stdin
+        if not line.strip():
+            continue
+        request_id = None # echoed on errors too, so the caller waiting on it is released
+        try:
+            request = json_loads(line)
+            request_id = request.pop("id", None) if isinstance(request, dict) else None
+            check_request(request)
+        except ValueError as e:
+            write_line({"error": f"malformed request: {e}", "id": request_id})
+            continue
+        task = asyncio.create_task(answer(request_id, request))
+        answering.add(task)
+        task.add_done_callback(answering.discard)
+
+    # Finish the queries already received before exiting
+    if answering:
+        await asyncio.wait(answering)
+
+def ask_daemon(request, socket_path=DAEMON_SOCKET):
+    """Sends request to a running daemon and returns its result, or None if no daemon answered in time."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(DAEMON_TIMEOUT_S)
+            sock.connect(socket_path)
+            sock.sendall(json_dumpb(request) + b"\n")
+            response = sock.makefile("rb").readline()
+    except OSError: # no daemon listening, a hung one (socket.timeout), or a dropped connection
+        return None
+    # An empty or error reply means the daemon couldn't answer; the caller parses the query itself
     try:
-        metadata_fields_map = json.loads(result_text)
-    except json.JSONDecodeError:
-        metadata_fields_map = {"error": "Failed to parse response as JSON", "raw_text": result_text}
-    
-    # Wrap the metadata_fields_map into the standard Query structure
-    result = {
-        "message": f"Extracted metadata from GPT (cost: ${cost:.6f})",
-        "metadata": metadata_fields_map 
-    }
-    
-    # Make sure this is the ONLY print statement in the whole script
-    print(json.dumps(result))
+        result = json_loads(response)
+    except ValueError:
+        return None
+    if "error" in result:
+        return None
+    return result
+
+def main():
+    # Batching daemon on a unix socket: python query_parser.py --daemon
+    if len(sys.argv) == 2 and sys.argv[1] == "--daemon":
+        asyncio.run(serve())
+        return
+    # The same batching daemon over stdin/stdout, as run by internal/query: python query_parser.py --serve
+    if len(sys.argv) == 2 and sys.argv[1] == "--serve":
+        asyncio.run(serve_stdio())
+        return
+
+    # Check if we are in reprompt mode (sys.argv[1] = prev_metadata_json, sys.argv[2] = new_user_input)
+    if len(sys.argv) == 3: # script_name, prev_metadata_json, new_user_input
+        request = {"previous_metadata": sys.argv[1], "new_input": sys.argv[2]}
+    elif len(sys.argv) == 2: # script_name, user_input
+        request = {"user_input": sys.argv[1]}
+    else: # No input or incorrect number of arguments
+        request = {"user_input": input("Please enter your search query: ")}
+
+    # Hand the query to the batching daemon if one is running, otherwise parse it ourselves
+    result = ask_daemon(request)
+    if result is None:
+        result = asyncio.run(parse_batch([request]))[0]
+
+    # Make sure this is the ONLY write to stdout in the whole script
+    write_line(result)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,187 @@
+package query
+
+import (
+	"bufio"
+	"encoding/json"
+	"fmt"
+	"os"
+	"os/exec"
+	"path/filepath"
+	"strings"
+	"sync"
+	"testing"
+)
+
+// TestHelperParserDaemon is not a real test: it is the stub parser daemon started by the tests
+// below (the test binary re-runs itself with QUERY_PARSER_STUB set). It speaks the same
+// id-tagged JSON-lines protocol as `query_parser.py --serve`.
+func TestHelperParserDaemon(t *testing.T) {
+	mode := os.Getenv("QUERY_PARSER_STUB")
+	if mode == "" {
+		return
+	}
+	defer os.Exit(0)
+
+	// Every start is recorded, so tests can count restarts
+	if f, err := os.OpenFile(os.Getenv("QUERY_PARSER_STUB_LOG"), os.O_APPEND|os.O_CREATE|os.O_WRONLY, 0o644); err == nil {
+		fmt.Fprintln(f, "start")
+		f.Close()
+	}
+
+	var held []map[string]interface{}
+	in := bufio.NewScanner(os.Stdin)
+	for in.Scan() {
+		var req map[string]interface{}
+		if err := json.Unmarshal(in.Bytes(), &req); err != nil {
+			os.Exit(2)
+		}
+		switch mode {
+		case "crash":
+			os.Exit(1)
+		case "crash-once":
+			// Only the first process dies; the restarted one answers normally
+			if _, err := os.Stat(os.Getenv("QUERY_PARSER_STUB_LOG") + ".crashed"); err != nil {
+				os.WriteFile(os.Getenv("QUERY_PARSER_STUB_LOG")+".crashed", nil, 0o644)
+				os.Exit(1)
+			}
+		case "error":
+			json.NewEncoder(os.Stdout).Encode(map[string]interface{}{"id": req["id"], "error": "boom"})
+			continue
+		case "reverse":
+			// Hold two requests, then answer them newest first
+			held = append(held, req)
+			if len(held) < 2 {
+				continue
+			}
+			for i := len(held) - 1; i >= 0; i-- {
+				writeStubReply(held[i])
+			}
+			held = nil
+			continue
+		}
+		writeStubReply(req)
+	}
+}
+
+func writeStubReply(req map[string]interface{}) {
+	json.NewEncoder(os.Stdout).Encode(map[string]interface{}{
+		"id":       req["id"],
+		"message":  "stub",
+		"metadata": map[string]interface{}{"photo_description": req["user_input"]},
+	})
+}
+
+// useStubDaemon points the package at the stub daemon in the given mode and returns the path of
+// its start log.
+func useStubDaemon(t *testing.T, mode string) string {
+	t.Helper()
+	logPath := filepath.Join(t.TempDir(), "starts.log")
+	original := parserCommand
+	parserCommand = func() (*exec.Cmd, error) {
+		cmd := exec.Command(os.Args[0], "-test.run=^TestHelperParserDaemon$")
+		cmd.Env = append(os.Environ(), "QUERY_PARSER_STUB="+mode, "QUERY_PARSER_STUB_LOG="+logPath)
+		return cmd, nil
+	}
+	t.Cleanup(func() {
+		Close()
+		parserCommand = original
+	})
+	return logPath
+}
+
+func countStarts(t *testing.T, logPath string) int {
+	t.Helper()
+	data, err := os.ReadFile(logPath)
+	if err != nil {
+		t.Fatalf("reading stub start log: %v", err)
+	}
+	return strings.Count(string(data), "start")
+}
+
+func TestParse_ReusesDaemon(t *testing.T) {
+	logPath := useStubDaemon(t, "echo")
+
+	for _, input := range []string{"red car", "blue sky"} {
+		q, _, err := Parse(input)
+		if err != nil {
+			t.Fatalf("Parse(%q): unexpected error: %v", input, err)
+		}
+		if got := q.Metadata["photo_description"]; got != input {
+			t.Errorf("Parse(%q): expected photo_description %q, got %v", input, input, got)
+		}
+	}
+	if n := countStarts(t, logPath); n != 1 {
+		t.Errorf("expected the daemon to start once, started %d times", n)
+	}
+}
+
+func TestParse_RepliesMatchedByID(t *testing.T) {
+	useStubDaemon(t, "reverse")
+
+	inputs := []string{"first", "second"}
+	got := make([]string, len(inputs))
+	errs := make([]error, len(inputs))
+	var wg sync.WaitGroup
+	for i, input := range inputs {
+		wg.Add(1)
+		go func(i int, input string) {
+			defer wg.Done()
+			q, _, err := Parse(input)
+			errs[i] = err
+			got[i], _ = q.Metadata["photo_description"].(string)
+		}(i, input)
+	}
+	wg.Wait()
+
+	for i, input := range inputs {
+		if errs[i] != nil {
+			t.Fatalf("Parse(%q): unexpected error: %v", input, errs[i])
+		}
+		if got[i] != input {
+			t.Errorf("Parse(%q): got the answer for %q", input, got[i])
+		}
+	}
+}
+
+func TestParse_RestartsDaemonOnce(t *testing.T) {
+	logPath := useStubDaemon(t, "crash-once")
+
+	q, _, err := Parse("red car")
+	if err != nil {
+		t.Fatalf("expected the restarted daemon to answer, got error: %v", err)
+	}
+	if got := q.Metadata["photo_description"]; got != "red car" {
+		t.Errorf("expected photo_description %q, got %v", "red car", got)
+	}
+	if n := countStarts(t, logPath); n != 2 {
+		t.Errorf("expected 2 daemon starts, got %d", n)
+	}
+}
+
+func TestParse_GivesUpAfterOneRestart(t *testing.T) {
+	logPath := useStubDaemon(t, "crash")
+
+	if _, _, err := Parse("red car"); err == nil {
+		t.Fatal("expected an error when the daemon keeps dying")
+	}
+	if n := countStarts(t, logPath); n != 2 {
+		t.Errorf("expected exactly 2 daemon starts, got %d", n)
+	}
+}
+
+func TestParse_ErrorReply(t *testing.T) {
+	logPath := useStubDaemon(t, "error")
+
+	_, _, err := Parse("red car")
+	if err == nil || !strings.Contains(err.Error(), "boom") {
+		t.Fatalf("expected the daemon's error to be returned, got %v", err)
+	}
+
+	// A failed query must not cost the daemon: the next call reuses it
+	if _, _, err := Parse("blue sky"); err == nil {
+		t.Fatal("expected the second query to fail the same way")
+	}
+	if n := countStarts(t, logPath); n != 1 {
+		t.Errorf("expected the daemon to stay up after an error reply, started %d times", n)
+	}
+}
@@ -1,6 +1,7 @@
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg') # Render straight to PNG; never initialise a GUI toolkit
 import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 import numpy as np
 import pathlib # Added pathlib
@@ -22,8 +23,17 @@ def plot_speedup(csv_filepath=default_csv_filepath, output_dir=default_output_di
         print(f"Error: CSV file not found at {csv_filepath}")
         return
 
+    # Checked up front because the pyarrow engine reports an empty file as a generic parse error
+    if os.path.getsize(csv_filepath) == 0:
+        print(f"Error: CSV file {csv_filepath} is empty.")
+        return
+
     try:
-        df = pd.read_csv(csv_filepath)
+        # The pyarrow engine parses with multiple threads; fall back to the C parser if it isn't installed
+        try:
+            df = pd.read_csv(csv_filepath, engine='pyarrow', dtype_backend='pyarrow')
+        except ImportError:
+            df = pd.read_csv(csv_filepath)
     except pd.errors.EmptyDataError:
         print(f"Error: CSV file {csv_filepath} is empty.")
         return
@@ -43,72 +53,70 @@ def plot_speedup(csv_filepath=default_csv_filepath, output_dir=default_output_di
     df['size'] = df['size'].astype(int)
     df['time_ms'] = df['time_ms'].astype(float)
 
+    # Lines are drawn point by point, so rows must be in thread order (the CSV need not be)
+    df = df.sort_values('threads', kind='stable').reset_index(drop=True)
+
     # Create output directory if it doesn't exist
     os.makedirs(output_dir, exist_ok=True)
     print(f"Plots will be saved to: {os.path.abspath(output_dir)}")
 
-    dataset_sizes = df['size'].unique()
-    modes = df['mode'].unique()
-
-    for size_val in dataset_sizes:
-        plt.figure(figsize=(12, 8))
-        size_df = df[df['size'] == size_val].copy()
-
-        if size_df.empty:
-            print(f"No data found for dataset size: {size_val}")
-            continue
-
-        # Find the sequential time (mode='seq', threads=1) for this size as baseline
-        seq_run = size_df[(size_df['mode'] == 'seq') & (size_df['threads'] == 1)]
-
-        if seq_run.empty:
+    # Compute every row's speedup in one vectorized pass. The baseline is the sequential run
+    # (mode='seq', threads=1) of the same size; sizes without one fall back to the 1-thread
+    # run of the row's own mode.
+    seq_baseline = df[(df['mode'] == 'seq') & (df['threads'] == 1)].drop_duplicates('size').set_index('size')['time_ms']
+    t1_baseline = df[df['threads'] == 1].drop_duplicates(['size', 'mode']).set_index(['size', 'mode'])['time_ms']
+    df['seq_baseline_ms'] = seq_baseline.reindex(df['size']).to_numpy()
+    df['t1_baseline_ms'] = t1_baseline.reindex(pd.MultiIndex.from_frame(df[['size', 'mode']])).to_numpy()
+    df['speedup'] = df['seq_baseline_ms'].to_numpy() / df['time_ms'].to_numpy()
+    df['t1_speedup'] = df['t1_baseline_ms'].to_numpy() / df['time_ms'].to_numpy()
+
+    # Partition once: order rows by (size, mode), keeping sizes and modes in their order of
+    # first appearance so legend order and line colours stay stable. Every group below is then
+    # a contiguous slice; lexsort is stable, so each slice keeps the thread order from above.
+    size_codes, _ = pd.factorize(df['size'])
+    mode_codes, _ = pd.factorize(df['mode'])
+    order = np.lexsort((mode_codes, size_codes))
+    df = df.iloc[order].reset_index(drop=True)
+
+    # One figure is reused for every size; clearing the axes is cheaper than building a new figure
+    fig, ax = plt.subplots(figsize=(12, 8))
+
+    for size_val, size_df in df.groupby('size', sort=False):
+        ax.clear()
+
+        sequential_time = size_df['seq_baseline_ms'].iloc[0]
+
+        if pd.isna(sequential_time):
             print(f"Warning: Sequential baseline (mode='seq', threads=1) not found for size {size_val}.")
             print("Speedup will be calculated relative to the 1-thread performance of each parallel mode.")
             
-            for mode_val in modes:
+            for mode_val, mode_specific_df in size_df.groupby('mode', sort=False):
                 if mode_val == 'seq':
                     continue # Skip seq mode itself if its baseline is missing for others
 
-                mode_specific_df = size_df[size_df['mode'] == mode_val].copy()
-                if mode_specific_df.empty:
-                    continue
-
-                baseline_t1_run = mode_specific_df[mode_specific_df['threads'] == 1]
-                if not baseline_t1_run.empty:
-                    baseline_t1_time = baseline_t1_run['time_ms'].iloc[0]
-                    if baseline_t1_time > 0:
-                        mode_specific_df['speedup'] = baseline_t1_time / mode_specific_df['time_ms']
-                        sns.lineplot(data=mode_specific_df, x='threads', y='speedup', label=f'{mode_val} (vs {mode_val} T1)', marker='o', errorbar=None)
-                    else:
-                        print(f"  Baseline T1 time for {mode_val} at size {size_val} is 0 or less, cannot calculate speedup.")
-                else:
+                baseline_t1_time = mode_specific_df['t1_baseline_ms'].iloc[0]
+                if pd.isna(baseline_t1_time):
                     print(f"  1-thread run for mode '{mode_val}' at size {size_val} not found. Cannot calculate speedup for this mode.")
+                elif baseline_t1_time > 0:
+                    ax.plot(mode_specific_df['threads'].to_numpy(), mode_specific_df['t1_speedup'].to_numpy(), label=f'{mode_val} (vs {mode_val} T1)', marker='o')
+                else:
+                    print(f"  Baseline T1 time for {mode_val} at size {size_val} is 0 or less, cannot calculate speedup.")
         else:
-            sequential_time = seq_run['time_ms'].iloc[0]
             print(f"Sequential baseline for size {size_val}: {sequential_time:.2f} ms")
 
             if sequential_time <= 0:
                 print(f"Warning: Sequential baseline time for size {size_val} is {sequential_time} ms. Cannot calculate meaningful speedup.")
                 # Plot raw times instead or skip
-                plt.close()
                 continue
 
-
-            # Calculate speedup for all modes relative to sequential
-            # For 'seq' mode itself, speedup will be 1 (or slightly off due to float precision if not handled)
-            size_df['speedup'] = sequential_time / size_df['time_ms']
-            
             # Plot for each mode
-            for mode_val in modes:
-                mode_data = size_df[size_df['mode'] == mode_val]
-                if mode_data.empty:
-                    continue
+            for mode_val, mode_data in size_df.groupby('mode', sort=False):
                 if mode_val == 'seq':
                      # Ensure 'seq' is plotted as a flat line at 1 if it's the baseline
                     seq_threads = mode_data['threads'].unique()
-                    sns.lineplot(x=seq_threads, y=[1.0]*len(seq_threads), label=f'{mode_val} (Baseline)', linestyle='--', color='gray', marker='o')
+                    ax.plot(seq_threads, [1.0]*len(seq_threads), label=f'{mode_val} (Baseline)', linestyle='--', color='gray', marker='o')
                 else:
-                    sns.lineplot(data=mode_data, x='threads', y='speedup', label=mode_val, marker='o', errorbar=None)
+                    ax.plot(mode_data['threads'].to_numpy(), mode_data['speedup'].to_numpy(), label=mode_val, marker='o')
         
         # Ideal speedup line
         # Find max threads plotted for this size, excluding seq if it only has 1 thread point
@@ -120,29 +128,30 @@ def plot_speedup(csv_filepath=default_csv_filepath, output_dir=default_output_di
         if len(plotted_threads) > 0:
             max_threads_for_ideal_line = np.max(plotted_threads)
             if max_threads_for_ideal_line > 0:
-                 plt.plot([1, max_threads_for_ideal_line], [1, max_threads_for_ideal_line], 
+                 ax.plot([1, max_threads_for_ideal_line], [1, max_threads_for_ideal_line], 
                           label='Ideal Speedup', linestyle=':', color='black', alpha=0.7)
 
-        plt.title(f'Speedup vs. Threads (Dataset Size: {size_val:,})')
-        plt.xlabel('Number of Threads/Workers')
-        plt.ylabel(f'Speedup (Baseline: Sequential Time or T1 of mode)')
+        ax.set_title(f'Speedup vs. Threads (Dataset Size: {size_val:,})')
+        ax.set_xlabel('Number of Threads/Workers')
+        ax.set_ylabel(f'Speedup (Baseline: Sequential Time or T1 of mode)')
         
         # Set x-axis ticks to be the actual thread counts tested
         all_tested_threads = sorted(df['threads'].unique())
-        plt.xticks(all_tested_threads)
+        ax.set_xticks(all_tested_threads)
         
-        plt.grid(True, which="both", ls="-", alpha=0.5)
-        plt.legend(title="Mode")
-        plt.tight_layout()
+        ax.grid(True, which="both", ls="-", alpha=0.5)
+        ax.legend(title="Mode")
+        fig.tight_layout()
         
         plot_filename = os.path.join(output_dir, f'speedup_size_{size_val}.png')
-        plt.savefig(plot_filename)
+        fig.savefig(plot_filename, dpi=100)
         print(f"Plot saved to {plot_filename}")
-        plt.close()
+
+    plt.close(fig)
 
 if __name__ == '__main__':
-    # Ensure matplotlib, seaborn, and pandas are installed:
-    # pip install pandas matplotlib seaborn numpy pathlib
+    # Ensure matplotlib and pandas are installed:
+    # pip install pandas matplotlib numpy pathlib
     plot_speedup()
     print("Plotting complete.")
 